@@ -1,7 +1,47 @@
 #!/usr/bin/env python
+import os
+import re
+from functools import partial
+from multiprocessing import Pool
 
 import click
-from rxn_biocatalysis_tools import EnzymaticReaction, tokenize_smiles
+from rxn_biocatalysis_tools import canon_smiles_cached, tokenize_smiles_cached
+
+# Splits a line into the precursors and the EC tokens (always starting with "[v")
+EC_TOKENS_REGEX = re.compile(r"^(.*?)(\[v.*)$")
+
+
+def canonicalize_line(line: str, pipe_char: str = "") -> str:
+    """Canonicalizes and orders the precursors of a (tokenized) line, keeping the EC tokens.
+
+    Args:
+        line: A (tokenized) line of precursors, optionally followed by EC tokens.
+        pipe_char: The string inserted between the precursors and the EC tokens. Defaults to "".
+
+    Returns:
+        The output line (including the line break).
+    """
+    original_smiles = line.strip()
+
+    # In case of a predicted source which includes the EC number (always starting with "[v")
+    # we need to take care of this
+    smiles_part = original_smiles.replace(" ", "")
+    ec_part = ""
+
+    # Writing non-sense items that occur in the backward prediction as is
+    try:
+        ec_match = EC_TOKENS_REGEX.match(smiles_part)
+        if ec_match:
+            smiles_part, ec_part = ec_match.groups()
+            ec_part = f" {ec_part.strip()}".replace("][", "] [")
+            smiles_part = smiles_part.strip()
+
+        # Canonicalisation + ordering is memoized, as the same precursors
+        # appear many times across predictions
+        sorted_canonicalised_smiles = canon_smiles_cached(smiles_part)
+        return f"{tokenize_smiles_cached(sorted_canonicalised_smiles)}{pipe_char}{ec_part}\n"
+    except:
+        return f"{original_smiles}\n"
 
 
 @click.command()
@@ -13,35 +53,19 @@ def main(input_file: str, output_file: str, pipe: bool):
     if pipe:
         pipe_char = " |"
 
-    smiles = []
-    with open(input_file, "r") as f:
-        for line in f:
-            smiles.append(line.strip())
-
-    with open(output_file, "w+") as f:
-        for original_smiles in smiles:
-            # In case of a predicted source which includes the EC number (always starting with "[v")
-            # we need to take care of this
-            smiles_part = original_smiles.replace(" ", "")
-            ec_part = ""
-
-            # Writing non-sense items that occur in the backward prediction as is
-            try:
-                ec_index = smiles_part.find("[v")
-                if ec_index > -1:
-                    ec_part = f" {smiles_part[ec_index:].strip()}".replace("][", "] [")
-                    smiles_part = smiles_part[:ec_index].strip()
-
-                # Using the EnzymaticReaction class here to get canonicalisation + ordering
-                # ">>" is needed for it to be recoganised as a valid rxn smiles / smarts
-                rxn = EnzymaticReaction(smiles_part + ">>")
-                rxn.sort()
-                sorted_canonicalised_smiles = ".".join(rxn.get_reactants_as_smiles())
-                f.write(
-                    f"{tokenize_smiles(sorted_canonicalised_smiles)}{pipe_char}{ec_part}\n"
+    # Stream line by line (with a large write buffer) instead of loading
+    # the whole input into memory first. The lines are canonicalized by a
+    # pool of worker processes, imap keeps the output in input order
+    with open(output_file, "w", buffering=1 << 20) as fout:
+        with open(input_file, "r") as fin:
+            with Pool(os.cpu_count()) as pool:
+                fout.writelines(
+                    pool.imap(
+                        partial(canonicalize_line, pipe_char=pipe_char),
+                        fin,
+                        chunksize=1024,
+                    )
                 )
-            except:
-                f.write(f"{original_smiles}\n")
 
 
 if __name__ == "__main__":
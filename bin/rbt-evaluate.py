@@ -1,107 +1,175 @@
 #!/usr/bin/env python
-from typing import List, DefaultDict, Tuple, Dict
-from collections import defaultdict
+import os
+from typing import List, Tuple, Dict, Optional, Callable
+from functools import partial
+from multiprocessing.pool import Pool
 from pathlib import Path
 
 import click
+import numpy as np
 import pandas as pd
-from tqdm import trange
+from tqdm import tqdm
 
 from rxn_biocatalysis_tools import (
     EnzymaticReaction,
     detokenize_enzymatic_reaction_smiles,
 )
 
+CHUNKSIZE = 256
 
-def get_ec_prediction_accuracy(
-    ground_truth: List[EnzymaticReaction],
-    predictions: List[List[EnzymaticReaction]],
-    pred_level: int = 3,
-    group_by_level: int = 1,
-    top_n: int = 1,
-) -> Tuple[Dict[str, float], List[str], List[Tuple[str, str]]]:
-    """Returns the prediction accuracy of EC classes at a given level.
+# Placeholder reaction for predictions that can't be parsed
+INVALID_PREDICTION = EnzymaticReaction("C>>C")
+
+
+def read_lines(path: Path) -> List[str]:
+    """Reads the stripped lines of a file at once.
 
     Args:
-        ground_truth: The enzymatic reactions representing the ground truth.
-        predictions: The enzymatic reactions representing the predictions.
-        pred_level: The predicted EC level. Defaults to 3.
-        group_by_level: The EC level by which to group and evaluate correctness (up to pred_level). Defaults to 1.
-        top_n: The number of predictions per ground truth reaction to consider. Defaults to 1.
+        path: The path of the file.
 
     Returns:
-        Per-group and overall accuracies.
+        The stripped lines of the file.
     """
-    n_correct: DefaultDict[str, int] = defaultdict(int)
-    n_total: DefaultDict[str, int] = defaultdict(int)
+    with open(path, "rb") as f:
+        return [line.strip() for line in f.read().decode().splitlines()]
+
+
+def parse_reaction(rxn_smiles: str, isomeric_smiles: bool = True) -> EnzymaticReaction:
+    """Parses a tokenized enzymatic reaction.
 
-    n_correct_total = 0
+    Args:
+        rxn_smiles: A tokenized enzymatic reaction SMILES.
+        isomeric_smiles: Whether to keep stereochemistry. Defaults to True.
 
-    incorrect = []
-    correct = []
-    for gt, preds in zip(ground_truth, predictions):
-        pred_ecs = [pred.get_ec(pred_level) for pred in preds[:top_n]]
-        if gt.get_ec(pred_level) in pred_ecs:
-            n_correct[gt.get_ec(group_by_level)] += 1
-            n_correct_total += 1
-            correct.append(gt.get_ec(pred_level))
-        else:
-            incorrect.append((gt.get_ec(pred_level), pred_ecs[0]))
+    Returns:
+        The enzymatic reaction.
+    """
+    return EnzymaticReaction(
+        detokenize_enzymatic_reaction_smiles(rxn_smiles),
+        isomericSmiles=isomeric_smiles,
+    )
 
-        n_total[gt.get_ec(group_by_level)] += 1
 
-    results = {}
-    for key, value in n_total.items():
-        results[key] = n_correct[key] / value
+def get_strings(rxn: EnzymaticReaction) -> Tuple[str, str, str]:
+    """Returns the strings of a reaction that are compared in the evaluation.
 
-    results["overall"] = n_correct_total / len(ground_truth)
+    Args:
+        rxn: An enzymatic reaction.
 
-    return results, correct, incorrect
+    Returns:
+        The reaction string, the EC (three levels), and the EC class of the reaction.
+    """
+    return rxn.to_string(), rxn.get_ec(3), rxn.get_ec(1)
+
+
+def parse_ground_truth(
+    rxn_smiles: str, isomeric_smiles: bool = True
+) -> Tuple[str, str, str]:
+    """Parses a ground truth tokenized enzymatic reaction into the strings compared in the evaluation.
+
+    Args:
+        rxn_smiles: A tokenized enzymatic reaction SMILES.
+        isomeric_smiles: Whether to keep stereochemistry. Defaults to True.
+
+    Returns:
+        The reaction string, the EC (three levels), and the EC class of the reaction.
+    """
+    return get_strings(parse_reaction(rxn_smiles, isomeric_smiles))
+
+
+def parse_prediction(
+    rxn_smiles: Optional[str], isomeric_smiles: bool = True
+) -> Tuple[str, str, str]:
+    """Parses a predicted tokenized enzymatic reaction into the strings compared in the evaluation.
+
+    Args:
+        rxn_smiles: A tokenized enzymatic reaction SMILES (None if there is no prediction).
+        isomeric_smiles: Whether to keep stereochemistry. Defaults to True.
+
+    Returns:
+        The reaction string, the EC (three levels), and the EC class of the reaction,
+        those of INVALID_PREDICTION if the prediction is invalid.
+    """
+    try:
+        return get_strings(parse_reaction(rxn_smiles, isomeric_smiles))  # type: ignore
+    except:
+        return get_strings(INVALID_PREDICTION)
 
 
-def get_accuracies(
-    ground_truth: List[EnzymaticReaction],
-    predictions: List[List[EnzymaticReaction]],
-    group_by_level: int = 1,
+def parse_candidates(
+    pool: Pool,
+    parse: Callable[[Optional[str]], Tuple[str, str, str]],
+    rxn_smiles: List[Optional[str]],
+    top_n: int,
+) -> np.ndarray:
+    """Parses predicted reactions in parallel and groups them per ground truth reaction.
+
+    Args:
+        pool: The process pool to parse the reactions with.
+        parse: The function parsing a single prediction into its strings.
+        rxn_smiles: The tokenized predictions, top_n consecutive entries per ground truth reaction.
+        top_n: The number of predictions per ground truth reaction.
+
+    Returns:
+        The strings of the top_n parsed predictions for each ground truth reaction as an
+        object array of shape (N, top_n, 3).
+    """
+    parsed = list(
+        tqdm(
+            pool.imap(parse, rxn_smiles, chunksize=CHUNKSIZE),
+            total=len(rxn_smiles),
+        )
+    )
+    return to_array(parsed).reshape(-1, top_n, 3)
+
+
+def get_accuracies_from_arrays(
+    ground_truth: np.ndarray,
+    predictions: np.ndarray,
+    groups: np.ndarray,
     top_n: int = 1,
 ) -> Tuple[Dict[str, float], List[str], List[Tuple[str, str]]]:
-    """Returns the reaction (plus EC number for backward) prediction accuracies.
+    """Returns the per-group and overall top-n accuracies of predictions.
 
     Args:
-        ground_truth: The enzymatic reactions representing the ground truth.
-        predictions: The enzymatic reactions representing the predictions.
-        group_by_level: The EC level by which to group and evaluate correctness. Defaults to 1.
-        top_n: The number of predictions per ground truth reaction to consider. Defaults to 1.
+        ground_truth: The strings (reactions or ECs) representing the ground truth, shape (N,).
+        predictions: The strings representing the predictions, shape (N, >= top_n).
+        groups: The group (e.g. EC class) of each ground truth entry.
+        top_n: The number of predictions per ground truth entry to consider. Defaults to 1.
 
     Returns:
         Per-group and overall accuracies.
     """
-    n_correct: DefaultDict[str, int] = defaultdict(int)
-    n_total: DefaultDict[str, int] = defaultdict(int)
-    n_correct_total = 0
-    correct = []
-    incorrect = []
-
-    for gt, preds in zip(ground_truth, predictions):
-        pred_rxns = [pred.to_string() for pred in preds[:top_n]]
-        if gt.to_string() in pred_rxns:
-            n_correct[gt.get_ec(group_by_level)] += 1
-            n_correct_total += 1
-            correct.append(gt.to_string())
-        else:
-            incorrect.append((gt.to_string(), pred_rxns[0]))
+    is_correct = (predictions[:, :top_n] == ground_truth[:, None]).any(axis=1)
 
-        n_total[gt.get_ec(group_by_level)] += 1
+    codes, uniques = pd.factorize(groups)
+    n_correct = np.bincount(codes, weights=is_correct, minlength=len(uniques))
+    n_total = np.bincount(codes, minlength=len(uniques))
 
-    results = {}
-    for key, value in n_total.items():
-        results[key] = n_correct[key] / value
+    results = dict(zip(uniques, n_correct / n_total))
+    results["overall"] = is_correct.sum() / len(ground_truth)
 
-    results["overall"] = n_correct_total / len(ground_truth)
+    correct = list(ground_truth[is_correct])
+    incorrect = list(zip(ground_truth[~is_correct], predictions[~is_correct, 0]))
 
     return results, correct, incorrect
 
 
+def to_array(rows: List[Tuple[str, str, str]]) -> np.ndarray:
+    """Converts the string triples returned by the parse functions to an object array of shape (len(rows), 3).
+
+    Args:
+        rows: The string triples.
+
+    Returns:
+        The object array.
+    """
+    arr = np.empty((len(rows), 3), dtype=object)
+    for i, row in enumerate(rows):
+        arr[i] = row
+    return arr
+
+
 @click.command()
 @click.argument("project_path", type=click.Path(exists=True))
 @click.option(
@@ -200,87 +268,100 @@ def main(
 
     data = {}
 
-    data["src-test"] = [line.strip() for line in open(Path(base_path, "src-test.txt"))]
-    data["tgt-test"] = [line.strip() for line in open(Path(base_path, "tgt-test.txt"))]
-    data["src-pred"] = [line.strip() for line in open(Path(base_path, "src-pred.txt"))]
-    data["tgt-pred"] = [line.strip() for line in open(Path(base_path, "tgt-pred.txt"))]
+    data["src-test"] = read_lines(Path(base_path, "src-test.txt"))
+    data["tgt-test"] = read_lines(Path(base_path, "tgt-test.txt"))
+    data["src-pred"] = read_lines(Path(base_path, "src-pred.txt"))
+    data["tgt-pred"] = read_lines(Path(base_path, "tgt-pred.txt"))
 
     if Path(base_path, "tgt-pred-rtrp.txt").exists():
-        data["tgt-pred-rtr"] = [
-            line.strip() for line in open(Path(base_path, "tgt-pred-rtrp.txt"))
-        ]
-
-    rxns_ground_truth = []
-    for i in trange(len(data["src-test"])):
-        rxns_ground_truth.append(
-            EnzymaticReaction(
-                detokenize_enzymatic_reaction_smiles(
-                    f"{data['src-test'][i]}>>{data['tgt-test'][i]}"
-                ),
-                isomericSmiles=isomeric_smiles,
+        data["tgt-pred-rtr"] = read_lines(Path(base_path, "tgt-pred-rtrp.txt"))
+
+    # Parse the reactions in parallel, the per-reaction work is independent
+    n_test = len(data["src-test"])
+    parse_gt = partial(parse_ground_truth, isomeric_smiles=isomeric_smiles)
+    parse_candidate = partial(parse_prediction, isomeric_smiles=isomeric_smiles)
+
+    # Only the strings are sent back from the workers, they are all that is compared
+    with Pool(os.cpu_count()) as pool:
+        ground_truth = to_array(
+            list(
+                tqdm(
+                    pool.imap(
+                        parse_gt,
+                        [
+                            f"{src}>>{tgt}"
+                            for src, tgt in zip(data["src-test"], data["tgt-test"])
+                        ],
+                        chunksize=CHUNKSIZE,
+                    ),
+                    total=n_test,
+                )
             )
         )
 
-    rxns_forward_pred = []
-    for i in trange(len(data["src-test"])):
-        offset = i * n_best_fw
-        candidates = []
-        for j in range(offset, offset + max_top_n_fw):
-            try:
-                candidates.append(
-                    EnzymaticReaction(
-                        detokenize_enzymatic_reaction_smiles(
-                            f"{data['src-test'][i]}>>{data['tgt-pred'][j]}"
-                        ),
-                        isomericSmiles=isomeric_smiles,
-                    )
+        forward_pred = parse_candidates(
+            pool,
+            parse_candidate,
+            [
+                (
+                    f"{data['src-test'][i]}>>{data['tgt-pred'][j]}"
+                    if j < len(data["tgt-pred"])
+                    else None
                 )
-            except:
-                candidates.append(EnzymaticReaction("C>>C"))
-
-        rxns_forward_pred.append(candidates)
-
-    rxns_backward_pred = []
-    for i in trange(len(data["tgt-test"])):
-        offset = i * n_best_bw
-        candidates = []
-        for j in range(offset, offset + max_top_n_bw):
-            try:
-                candidates.append(
-                    EnzymaticReaction(
-                        detokenize_enzymatic_reaction_smiles(
-                            f"{data['src-pred'][j]}>>{data['tgt-test'][i]}"
-                        ),
-                        isomericSmiles=isomeric_smiles,
-                    )
+                for i in range(n_test)
+                for j in range(i * n_best_fw, i * n_best_fw + max_top_n_fw)
+            ],
+            max_top_n_fw,
+        )
+
+        backward_pred = parse_candidates(
+            pool,
+            parse_candidate,
+            [
+                (
+                    f"{data['src-pred'][j]}>>{data['tgt-test'][i]}"
+                    if j < len(data["src-pred"])
+                    else None
                 )
-            except:
-                candidates.append(EnzymaticReaction("C>>C"))
+                for i in range(len(data["tgt-test"]))
+                for j in range(i * n_best_bw, i * n_best_bw + max_top_n_bw)
+            ],
+            max_top_n_bw,
+        )
 
-        rxns_backward_pred.append(candidates)
+        roundtrip_pred = np.empty((n_test, max_top_n_rtr, 3), dtype=object)
+
+        if Path(base_path, "tgt-pred-rtrp.txt").exists():
+            roundtrip_pred = parse_candidates(
+                pool,
+                parse_candidate,
+                [
+                    (
+                        f"{data['src-pred'][j]}>>{data['tgt-pred-rtr'][i * n_best_rtr * n_best_bw]}".replace(
+                            "\\\\", "\\"
+                        )  # for some reason this is escaped here. Windows problem? Check on *nix
+                        if j < len(data["src-pred"])
+                        and i * n_best_rtr * n_best_bw < len(data["tgt-pred-rtr"])
+                        else None
+                    )
+                    for i in range(len(data["tgt-test"]))
+                    for j in range(i * n_best_bw, i * n_best_bw + max_top_n_rtr)
+                ],
+                max_top_n_rtr,
+            )
 
-    rxns_roundtrip_pred = []
+    #
+    # Get the strings to compare once, they are reused for every top-n
+    #
 
-    if Path(base_path, "tgt-pred-rtrp.txt").exists():
-        for i in trange(len(data["tgt-test"])):
-            offset = i * n_best_bw
-            candidates = []
-            for j in range(offset, offset + max_top_n_rtr):
-                try:
-                    candidates.append(
-                        EnzymaticReaction(
-                            detokenize_enzymatic_reaction_smiles(
-                                f"{data['src-pred'][j]}>>{data['tgt-pred-rtr'][i * n_best_rtr * n_best_bw]}".replace(
-                                    "\\\\", "\\"
-                                )  # for some reason this is escaped here. Windows problem? Check on *nix
-                            ),
-                            isomericSmiles=isomeric_smiles,
-                        )
-                    )
-                except:
-                    candidates.append(EnzymaticReaction("C>>C"))
+    gt_strs = ground_truth[:, 0]
+    gt_ecs = ground_truth[:, 1]
+    gt_groups = ground_truth[:, 2]
 
-            rxns_roundtrip_pred.append(candidates)
+    fw_strs = forward_pred[:, :, 0]
+    bw_strs = backward_pred[:, :, 0]
+    bw_ecs = backward_pred[:, :, 1]
+    rtr_strs = roundtrip_pred[:, :, 0]
 
     #
     # Calculate accuracies
@@ -290,8 +371,8 @@ def main(
 
     print("Assessing forward accuracy...")
     for top_n in top_n_fw:
-        acc_forward, correct, incorrect = get_accuracies(
-            rxns_ground_truth, rxns_forward_pred, 1, top_n
+        acc_forward, correct, incorrect = get_accuracies_from_arrays(
+            gt_strs, fw_strs, gt_groups, top_n
         )
 
         with open(Path(base_path, f"correct_fw_{top_n}.txt"), "w+") as f:
@@ -314,8 +395,8 @@ def main(
 
     print("Assessing backward accuracy...")
     for top_n in top_n_bw:
-        acc_backward, correct, incorrect = get_accuracies(
-            rxns_ground_truth, rxns_backward_pred, 1, top_n
+        acc_backward, correct, incorrect = get_accuracies_from_arrays(
+            gt_strs, bw_strs, gt_groups, top_n
         )
 
         with open(Path(base_path, f"correct_bw_{top_n}.txt"), "w+") as f:
@@ -339,8 +420,8 @@ def main(
     if Path(base_path, "tgt-pred-rtrp.txt").exists():
         print("Assessing roundtrip accuracy...")
         for top_n in top_n_rtr:
-            acc_roundtrip, correct, incorrect = get_accuracies(
-                rxns_ground_truth, rxns_roundtrip_pred, 1, top_n
+            acc_roundtrip, correct, incorrect = get_accuracies_from_arrays(
+                gt_strs, rtr_strs, gt_groups, top_n
             )
 
             with open(Path(base_path, f"correct_rtrp_{top_n}.txt"), "w+") as f:
@@ -365,8 +446,8 @@ def main(
 
     print("Assessing EC accuracy...")
     for top_n in top_n_bw:
-        acc_ec_pred, correct, incorrect = get_ec_prediction_accuracy(
-            rxns_ground_truth, rxns_backward_pred, 3, 1, top_n
+        acc_ec_pred, correct, incorrect = get_accuracies_from_arrays(
+            gt_ecs, bw_ecs, gt_groups, top_n
         )
 
         with open(Path(base_path, f"correct_ec_{top_n}.txt"), "w+") as f:
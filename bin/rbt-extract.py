@@ -1,9 +1,28 @@
 #!/usr/bin/env python
+import csv
+from typing import Tuple
+from functools import lru_cache
 
 import click
 from rxn_biocatalysis_tools import EnzymaticReaction
 
 
+@lru_cache(maxsize=1_000_000)
+def get_molecules_as_smiles(smiles: str) -> Tuple[str, ...]:
+    """Returns the canonical SMILES of the molecules in one side of a reaction.
+
+    The results are memoized, as the same reactants and products occur across many
+    reactions (and EC classes).
+
+    Args:
+        smiles: The SMILES of the molecules, separated by ".".
+
+    Returns:
+        The canonical SMILES of the molecules.
+    """
+    return tuple(EnzymaticReaction(smiles + ">>").get_reactants_as_smiles())
+
+
 @click.command()
 @click.argument("input_file", type=click.Path(exists=True))
 @click.argument("output_file", type=click.Path())
@@ -15,17 +34,23 @@ from rxn_biocatalysis_tools import EnzymaticReaction
 )
 def main(input_file: str, output_file: str, level: int, data: str):
     with open(input_file, "r") as f_in:
-        with open(output_file, "w+") as f_out:
-            if data == "products":
-                for line in f_in:
-                    rxn = EnzymaticReaction(line)
-                    for smile in rxn.get_products_as_smiles():
-                        f_out.write(f"{smile},{rxn.get_ec(level)},{rxn.get_ec()}\n")
-            if data == "reactants":
-                for line in f_in:
-                    rxn = EnzymaticReaction(line)
-                    for smile in rxn.get_reactants_as_smiles():
-                        f_out.write(f"{smile},{rxn.get_ec(level)},{rxn.get_ec()}\n")
+        with open(output_file, "w", buffering=1 << 20, newline="") as f_out:
+            writer = csv.writer(f_out, lineterminator="\n")
+            for line in f_in:
+                # Split precursors|ec>agents>products by hand so that RDKit is only
+                # called (through the cache) on the side that is extracted
+                precursors, _, products = line.strip().split(">")
+                reactants, _, ec_str = precursors.partition("|")
+                ec = [ec_level.strip() for ec_level in ec_str.split(".")]
+                ec_at_level = ".".join(ec[:level])
+                # Like EnzymaticReaction.get_ec(), which defaults to 4 levels
+                ec_full = ".".join(ec[:4])
+
+                side = products if data == "products" else reactants
+                writer.writerows(
+                    (smile, ec_at_level, ec_full)
+                    for smile in get_molecules_as_smiles(side)
+                )
 
 
 if __name__ == "__main__":
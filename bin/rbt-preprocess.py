@@ -1,15 +1,19 @@
 #!/usr/bin/env python
 """Preprocess reactions for learning."""
 
-from typing import List, Tuple
+import os
+from typing import List, Tuple, FrozenSet, Iterable, NamedTuple, Any
 from pathlib import Path
 from collections import Counter
+from functools import lru_cache, partial
+from multiprocessing import Pool
 
 import click
 import pandas as pd
 from tqdm import trange
 
 from rdkit.Chem import AllChem as rdk
+from rdkit.Chem.rdchem import Mol
 
 from rxn_biocatalysis_tools import (
     EnzymaticReaction,
@@ -18,6 +22,30 @@ from rxn_biocatalysis_tools import (
 )
 
 
+class ReactionRecord(NamedTuple):
+    """The data of a processed reaction needed after parsing, sent back by the workers
+    instead of the (much larger) pickled enzymatic reaction."""
+
+    rxn_str: str
+    ec: str
+    source: str
+    n_reactants: int
+    n_products: int
+
+
+def parse_reaction(line: str, source: str = "unknown") -> EnzymaticReaction:
+    """Parse a line of an input file into an enzymatic reaction.
+
+    Args:
+        line: A line containing an enzymatic reaction SMILES
+        source: The source of the reaction
+
+    Returns:
+        The enzymatic reaction
+    """
+    return EnzymaticReaction(line.strip(), canonical=True, source=source)
+
+
 def process_reaction(
     rxn: EnzymaticReaction, min_atom_count: int = 4
 ) -> EnzymaticReaction:
@@ -42,24 +70,23 @@ def process_reaction(
 
 
 def remove_from_products(
-    rxn: EnzymaticReaction, smart_patterns: List[str], smiles: List[str]
+    rxn: EnzymaticReaction, patterns: List[Mol], smiles: FrozenSet[str]
 ) -> EnzymaticReaction:
-    """Remove the supplied cofactors from the products.
+    """Remove the molecules matching the supplied patterns or SMILES from the products.
 
     Args:
         rxn: An enzymatic reaction
-        cofactors: A list of SMILES of cofactors
+        patterns: A list of (compiled) SMARTS patterns
+        smiles: A set of canonical SMILES of molecules to be removed
 
     Returns:
-        The enzymatic reaction with the cofactors removed from the products
+        The enzymatic reaction with the matching molecules removed from the products
     """
 
     if len(rxn.products) == 1:
         return rxn
 
-    for smart_pattern in smart_patterns:
-        mol_pattern = rdk.MolFromSmarts(smart_pattern)
-
+    for mol_pattern in patterns:
         rxn.products = [
             mol for mol in rxn.products if not mol.HasSubstructMatch(mol_pattern)
         ]
@@ -67,25 +94,131 @@ def remove_from_products(
         if len(rxn.products) == 1:
             return rxn
 
-    rxn.products = [mol for mol in rxn.products if rxn.mol_to_smiles(mol) not in smiles]
+    # Only canonicalize the products if there are molecules to be removed
+    if smiles:
+        rxn.products = [
+            mol for mol in rxn.products if rxn.mol_to_smiles(mol) not in smiles
+        ]
 
     return rxn
 
 
-def print_sources(rxns: List[EnzymaticReaction], title: str) -> None:
+@lru_cache(maxsize=2**16)
+def to_tokenized_string(rxn_str: str, ec_level: int) -> Tuple[str, str]:
+    """Get the string and the tokenized string of a reaction with a certain number of EC levels.
+
+    The results are memoized on the reaction string, as duplicate reactions are common.
+
+    Args:
+        rxn_str: The string representing an enzymatic reaction
+        ec_level: The number of EC levels to include (top-down)
+
+    Returns:
+        The reaction string with the chosen levels of EC and its tokenized form
+    """
+    rxn_str_level = EnzymaticReaction(rxn_str).to_string(ec_level)
+    return (
+        rxn_str_level,
+        tokenize_enzymatic_reaction_smiles(rxn_str_level, keep_pipe=True),
+    )
+
+
+@lru_cache(maxsize=None)
+def compile_patterns(smart_patterns: Tuple[str, ...]) -> List[Mol]:
+    """Compile SMARTS patterns, memoized so that each (worker) process compiles them only once.
+
+    Args:
+        smart_patterns: SMARTS patterns
+
+    Returns:
+        The compiled patterns
+    """
+    return [rdk.MolFromSmarts(smart_pattern) for smart_pattern in smart_patterns]
+
+
+def parse_and_process_reaction(
+    line: str,
+    source: str = "unknown",
+    bi_directional: bool = False,
+    min_atom_count: int = 4,
+    remove_patterns: Tuple[str, ...] = (),
+    remove_smiles: FrozenSet[str] = frozenset(),
+    split_products: bool = False,
+) -> List[EnzymaticReaction]:
+    """Parse a line of an input file and apply all per-reaction processing steps in one go.
+
+    Args:
+        line: A line containing an enzymatic reaction SMILES
+        source: The source of the reaction
+        bi_directional: Whether to also return the reverse reaction
+        min_atom_count: Remove molecules with a heavy atom count smaller than this from the reaction
+        remove_patterns: SMARTS patterns of molecules to be removed from the products
+        remove_smiles: Canonical SMILES of molecules to be removed from the products
+        split_products: Whether to split multi-product reactions into one-product reactions
+
+    Returns:
+        The processed enzymatic reactions (the reverse reaction and split reactions included)
+        with ordered molecules
+    """
+    rxn = parse_reaction(line, source)
+    rxns = [rxn, rxn.reverse()] if bi_directional else [rxn]
+
+    patterns = compile_patterns(remove_patterns)
+    processed_rxns = []
+    for rxn in rxns:
+        process_reaction(rxn, min_atom_count)
+        remove_from_products(rxn, patterns, remove_smiles)
+
+        if not split_products or len(rxn.products) == 1:
+            processed_rxns.append(rxn)
+        else:
+            for product in rxn.get_products_as_smiles():
+                processed_rxns.append(
+                    EnzymaticReaction.from_smarts_and_ec(
+                        ".".join(rxn.get_reactants_as_smiles()) + ">>" + product,
+                        rxn.get_ec(),
+                        source=rxn.source,
+                    )
+                )
+
+    for rxn in processed_rxns:
+        rxn.sort()
+
+    return processed_rxns
+
+
+def parse_to_records(line: str, **kwargs: Any) -> List[ReactionRecord]:
+    """Parse and process a line of an input file and return the data of the resulting reactions.
+
+    Args:
+        line: A line containing an enzymatic reaction SMILES
+        kwargs: Keyword arguments supplied to parse_and_process_reaction
+
+    Returns:
+        The records of the processed enzymatic reactions
+    """
+    return [
+        ReactionRecord(
+            str(rxn), rxn.get_ec(), rxn.source, len(rxn.reactants), len(rxn.products)
+        )
+        for rxn in parse_and_process_reaction(line, **kwargs)
+    ]
+
+
+def print_sources(sources: Iterable[str], title: str) -> None:
     """Print the sources and numbers of reactions per source as a table.
 
     Args:
-        rxns: A list of enzymatic reactions
+        sources: The sources of the reactions
         title: The title of the table
     """
-    sources = [rxn.source for rxn in rxns]
+    counts = Counter(sources)
 
     print(f"\n\n{title}:")
-    for key, value in dict(Counter(sources)).items():
+    for key, value in dict(counts).items():
         print(f"{key} -", str(value))
 
-    print("Total:", len(rxns))
+    print("Total:", sum(counts.values()))
 
 
 def write_splits(df: pd.DataFrame, ec_level: int, output_dir: Path) -> None:
@@ -96,28 +229,27 @@ def write_splits(df: pd.DataFrame, ec_level: int, output_dir: Path) -> None:
         ec_level: The EC level to be exported (0 to 4)
         output_dir: The path to the directory the outputs will be written to.
     """
-    df_internal = df.copy()
-    splits = {}
-    splits["train"] = pd.DataFrame(columns=df_internal.columns)
-    splits["valid"] = pd.DataFrame(columns=df_internal.columns)
-    splits["test"] = pd.DataFrame(columns=df_internal.columns)
-
-    df_internal[["rxn_str"]].to_csv(
-        Path(output_dir, "combined.txt"), header=False, index=False
-    )
+    df[["rxn_str"]].to_csv(Path(output_dir, "combined.txt"), header=False, index=False)
 
     # Get the training set from reactions with unique products¨
-    prod_val_cnts = df_internal.products.value_counts()
-    df_unique_prods = df_internal[
-        df_internal.products.isin(prod_val_cnts.index[prod_val_cnts.eq(1)])
-    ]
-    df_internal.drop(df_unique_prods.index, inplace=True)
+    prod_val_cnts = df.products.value_counts()
+    is_unique_prod = df.products.isin(prod_val_cnts.index[prod_val_cnts.eq(1)])
+    df_unique_prods = df[is_unique_prod]
+    df_internal = df[~is_unique_prod]
+
+    # Collect the per-EC parts and concatenate them once at the end, appending
+    # to the splits in the loop would copy them on every iteration
+    train_parts: List[pd.DataFrame] = []
+    valid_parts: List[pd.DataFrame] = []
+    test_parts: List[pd.DataFrame] = []
+
+    # Partition the reactions with unique products in one pass
+    unique_prods_by_ec = dict(tuple(df_unique_prods.groupby("ec_1", sort=False)))
 
     # Always group by x.x.x.- for splits to have a good coverage and
     # not miss sub-sub-classes
-    for ec in df_internal.ec_1.unique():
-        df_subset = df_internal[df_internal.ec_1 == ec]
-        df_unique_prods_subset = df_unique_prods[df_unique_prods.ec_1 == ec]
+    for ec, df_subset in df_internal.groupby("ec_1", sort=False):
+        df_unique_prods_subset = unique_prods_by_ec.get(ec, df_unique_prods.iloc[:0])
 
         # Get 5% (of total) from rxns with unique products for test set
         n_total = len(df_subset) + len(df_unique_prods_subset)
@@ -125,17 +257,30 @@ def write_splits(df: pd.DataFrame, ec_level: int, output_dir: Path) -> None:
         df_test = df_unique_prods_subset.sample(
             n=min(n_samples, len(df_unique_prods_subset)), random_state=42
         )
-        df_unique_prods_subset.drop(df_test.index, inplace=True)
+        df_unique_prods_subset = df_unique_prods_subset.drop(df_test.index)
 
         # Join again to get training and validation sets
-        df_subset = df_subset.append(df_unique_prods_subset)
+        df_subset = pd.concat([df_subset, df_unique_prods_subset], ignore_index=True)
 
         df_valid = df_subset.sample(n=n_samples, random_state=42)
-        df_subset.drop(df_valid.index, inplace=True)
+        df_subset = df_subset.drop(df_valid.index)
 
-        splits["train"] = splits["train"].append(df_subset, ignore_index=True)
-        splits["valid"] = splits["valid"].append(df_valid, ignore_index=True)
-        splits["test"] = splits["test"].append(df_test, ignore_index=True)
+        train_parts.append(df_subset)
+        valid_parts.append(df_valid)
+        test_parts.append(df_test)
+
+    splits = {
+        key: (
+            pd.concat(parts, ignore_index=True)
+            if parts
+            else pd.DataFrame(columns=df.columns)
+        )
+        for key, parts in (
+            ("train", train_parts),
+            ("valid", valid_parts),
+            ("test", test_parts),
+        )
+    }
 
     for key, value in splits.items():
         value["reactants"].to_csv(
@@ -214,128 +359,98 @@ def main(
     remove_molecules = []
 
     if remove_patterns_path:
-        for line in open(remove_patterns_path):
-            if not line.startswith("//") and line.strip():
-                remove_patterns.append(line.split("//")[0].strip())
+        with open(remove_patterns_path) as f:
+            for line in f:
+                if not line.startswith("//") and line.strip():
+                    remove_patterns.append(line.split("//")[0].strip())
 
     if remove_molecules_path:
-        for line in open(remove_molecules_path):
-            if not line.startswith("//") and line.strip():
-                smiles = line.split("//")[0].strip()
-                mol = rdk.MolFromSmiles(smiles)
-                if mol:
-                    remove_molecules.append(rdk.MolToSmiles(mol))
-
-    enzymatic_reactions = []
-
-    for input_file in input_files:
-        source = Path(input_file).stem
-        line_count = sum([1 for line in open(input_file, "r")])
-
-        print(f"Parsing {source}...")
-        with open(input_file, "r") as f:
+        with open(remove_molecules_path) as f:
             for line in f:
-                rxn = EnzymaticReaction(line.strip(), canonical=True, source=source)
-                enzymatic_reactions.append(rxn)
-                if bi_directional:
-                    enzymatic_reactions.append(rxn.reverse())
-        print("Done.\n")
-
-    print_sources(enzymatic_reactions, "Parsed Reactions")
-
-    print(f"Processing reactions...")
-    for i, rxn in enumerate(enzymatic_reactions):
-        enzymatic_reactions[i] = process_reaction(rxn, min_atom_count)
-    print("Done.\n")
-
-    print("Removing patterns and molecules...")
-    for i, rxn in enumerate(enzymatic_reactions):
-        enzymatic_reactions[i] = remove_from_products(
-            rxn, remove_patterns, remove_molecules
-        )
-    print("Done.\n")
-
-    if split_products:
-        print(
-            "Splitting multi-product reactions into multiple one-product reactions..."
-        )
-        split_enzymatic_reactions = []
-        for rxn in enzymatic_reactions:
-            if len(rxn.products) == 1:
-                split_enzymatic_reactions.append(rxn)
-            else:
-                for product in rxn.get_products_as_smiles():
-                    split_enzymatic_reactions.append(
-                        EnzymaticReaction.from_smarts_and_ec(
-                            ".".join(rxn.get_reactants_as_smiles()) + ">>" + product,
-                            rxn.get_ec(),
-                            source=rxn.source,
-                        )
-                    )
-        enzymatic_reactions = split_enzymatic_reactions
-        print("Done.\n")
+                if not line.startswith("//") and line.strip():
+                    smiles = line.split("//")[0].strip()
+                    mol = rdk.MolFromSmiles(smiles)
+                    if mol:
+                        remove_molecules.append(rdk.MolToSmiles(mol))
+
+    records: List[ReactionRecord] = []
+    # The number of parsed reactions per source, before any processing
+    parsed_counts: Counter = Counter()
+
+    # Parse and process the reactions in a single pass over each file, using a
+    # pool of workers. Only the data needed from here on is sent back
+    with Pool(os.cpu_count(), initializer=disable_rdkit_logging) as pool:
+        for input_file in input_files:
+            source = Path(input_file).stem
+
+            print(f"Parsing and processing {source}...")
+            with open(input_file, "r") as f:
+                for rxn_records in pool.imap(
+                    partial(
+                        parse_to_records,
+                        source=source,
+                        bi_directional=bi_directional,
+                        min_atom_count=min_atom_count,
+                        remove_patterns=tuple(remove_patterns),
+                        remove_smiles=frozenset(remove_molecules),
+                        split_products=split_products,
+                    ),
+                    f,
+                    chunksize=256,
+                ):
+                    records.extend(rxn_records)
+                    parsed_counts[source] += 2 if bi_directional else 1
+            print("Done.\n")
+
+    print_sources(parsed_counts.elements(), "Parsed Reactions")
 
     print(
         f"Removing reactions with less than 2 reactans or more than {max_products} product(s)..."
     )
-    enzymatic_reactions = [
-        rxn
-        for rxn in enzymatic_reactions
-        if len(rxn.reactants) > 0
-        and len(rxn.products) <= max_products
-        and len(rxn.products) > 0
+    records = [
+        record
+        for record in records
+        if record.n_reactants > 0
+        and record.n_products <= max_products
+        and record.n_products > 0
     ]
     print("Done.\n")
 
-    print("Ordering molecules on both sides of the reactions...")
-    for rxn in enzymatic_reactions:
-        rxn.sort()
-    print("Done.")
-
-    print_sources(enzymatic_reactions, "Reactions after Filtering")
-
-    df = pd.DataFrame({"rxn": enzymatic_reactions})
+    print_sources([record.source for record in records], "Reactions after Filtering")
 
     print("Processing reactions for export...")
 
-    cols = {}
-
-    cols["rxn_str"] = []
-    cols["ec"] = []
-    cols["source"] = []
+    df = pd.DataFrame(
+        {
+            "rxn_str": [record.rxn_str for record in records],
+            "ec": [record.ec for record in records],
+            "source": [record.source for record in records],
+        }
+    )
 
+    # Derive the EC levels from the full EC using vectorized string operations
+    ec_split = df.ec.str.split(".")
     for ec_level in range(1, 5):
-        cols[f"ec_{ec_level}"] = []
-
-    for ec_level in ec_levels:
-        cols[f"rxn_str_ec{ec_level}"] = []
-        cols[f"rxn_str_ec{ec_level}_tok"] = []
-
-    for rxn in df.rxn:
-        cols["rxn_str"].append(str(rxn))
-        cols["ec"].append(rxn.get_ec())
-        cols["source"].append(rxn.source)
-
-        for ec_level in range(1, 5):
-            cols[f"ec_{ec_level}"].append(rxn.get_ec(ec_level))
+        df[f"ec_{ec_level}"] = ec_split.str[:ec_level].str.join(".")
 
+    # Getting the (tokenized) reaction strings per EC level requires RDKit,
+    # run it in parallel
+    with Pool(os.cpu_count(), initializer=disable_rdkit_logging) as pool:
         for ec_level in ec_levels:
-            rxn_str_level = rxn.to_string(ec_level)
-            cols[f"rxn_str_ec{ec_level}"].append(rxn_str_level)
-
-            cols[f"rxn_str_ec{ec_level}_tok"].append(
-                tokenize_enzymatic_reaction_smiles(rxn_str_level, keep_pipe=True)
+            rxn_strs_level = pool.starmap(
+                to_tokenized_string,
+                [(rxn_str, ec_level) for rxn_str in df.rxn_str],
+                chunksize=256,
             )
-
-    for key, value in cols.items():
-        df[key] = value
+            df[f"rxn_str_ec{ec_level}"] = [rxn_str for rxn_str, _ in rxn_strs_level]
+            df[f"rxn_str_ec{ec_level}_tok"] = [tok for _, tok in rxn_strs_level]
 
     df = df[(df.ec != "") & (df.ec != " ")]
     df = df.drop_duplicates(subset=[f"rxn_str"], keep="first")
 
     print("Done.\n")
 
-    print_sources(df.rxn, "Reactions after Deduplication")
+    print_sources(df.source, "Reactions after Deduplication")
 
     df[["rxn_str", "ec", "source"]].to_csv(
         Path(output_path, "combined_rxn_ec_sources.txt"), header=False, index=False
@@ -347,8 +462,8 @@ def main(
     for ec_level in ec_levels:
         task = tasks.pop(0)
 
-        df_tmp = df.copy()
-        df_tmp = df_tmp.drop_duplicates(subset=[f"rxn_str_ec{ec_level}"], keep="first")
+        # drop_duplicates already returns a new frame, no need to copy df first
+        df_tmp = df.drop_duplicates(subset=[f"rxn_str_ec{ec_level}"], keep="first")
 
         # If someone finds a way on how to combne a split and assignment to two
         # columns with .loc, please change it. Otherwise surpress the warning
@@ -1,8 +1,14 @@
 #!/usr/bin/env python
 
-from random import shuffle, choice
+import re
+from typing import List, DefaultDict, Sequence
+from collections import defaultdict
+from random import shuffle, randrange
 import click
-from rxn_biocatalysis_tools import EnzymaticReaction, tokenize_smiles
+from rxn_biocatalysis_tools import tokenize_smiles_batch
+
+# Splits a line into the precursors and the EC tokens (always starting with "[v")
+EC_TOKENS_REGEX = re.compile(r"^(.*?)(\[v.*)$")
 
 
 @click.command()
@@ -24,28 +30,51 @@ def main(input_file: str, output_file: str, pipe: bool, within_class, shuffle_on
             smiles_part = line.strip().replace(" ", "")
             ec_part = ""
 
-            ec_index = smiles_part.find("[v")
-            if ec_index > -1:
-                ec_part = f" {smiles_part[ec_index:].strip()}".replace("][", "] [")
-                smiles_part = smiles_part[:ec_index].strip()
+            ec_match = EC_TOKENS_REGEX.match(smiles_part)
+            if ec_match:
+                smiles_part, ec_part = ec_match.groups()
+                ec_part = f" {ec_part.strip()}".replace("][", "] [")
+                smiles_part = smiles_part.strip()
             smiles.append(smiles_part)
             ecs.append(ec_part)
 
+    tokenized_smiles = tokenize_smiles_batch(smiles)
+
     ecs_shuffled = ecs.copy()
     shuffle(ecs_shuffled)
 
     if shuffle_only:
         with open(output_file, "w+") as f:
-            for smi, ec in zip(smiles, ecs_shuffled):
-                f.write(f"{tokenize_smiles(smi)}{pipe_char}{ec}\n")
+            for smi, ec in zip(tokenized_smiles, ecs_shuffled):
+                f.write(f"{smi}{pipe_char}{ec}\n")
     else:
+        # Group the line indices by EC class once instead of filtering all ECs for every line
+        indices_by_class: DefaultDict[str, List[int]] = defaultdict(list)
+        position_in_class: List[int] = []
+        if within_class:
+            for i, ec in enumerate(ecs):
+                position_in_class.append(len(indices_by_class[ec[3]]))
+                indices_by_class[ec[3]].append(i)
+
         with open(output_file, "w+") as f:
-            for smi, ec in zip(smiles, ecs):
-                ecs_tmp = [item for item in ecs if item is not ec]
+            for i, (smi, ec) in enumerate(zip(tokenized_smiles, ecs)):
+                indices: Sequence[int]
                 if within_class:
-                    ecs_tmp = [item for item in ecs if item[3] == ec[3]]
+                    indices = indices_by_class[ec[3]]
+                    position = position_in_class[i]
+                else:
+                    indices = range(len(ecs))
+                    position = i
+
+                # Uniformly draw the EC of any other line, skipping the current index
+                # (unless it is the only candidate)
+                if len(indices) > 1:
+                    j = randrange(len(indices) - 1)
+                    ec_random = ecs[indices[j + (j >= position)]]
+                else:
+                    ec_random = ec
 
-                f.write(f"{tokenize_smiles(smi)}{pipe_char}{choice(ecs_tmp)}\n")
+                f.write(f"{smi}{pipe_char}{ec_random}\n")
 
 
 if __name__ == "__main__":
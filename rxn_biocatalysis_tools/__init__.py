@@ -4,8 +4,10 @@ from .tokenizer import (
     tokenize_enzymatic_reaction_smiles,
     detokenize_enzymatic_reaction_smiles,
     tokenize_smiles,
+    tokenize_smiles_cached,
+    tokenize_smiles_batch,
 )
-from .utils import disable_rdkit_logging
+from .utils import disable_rdkit_logging, canon_smiles_cached
 
 __name__ = "rxn-biocatalysis-tools"
 __version__ = "1.0.1"
@@ -1,6 +1,9 @@
 """ Contains the class Reaction representing unidirectional reactions. """
 from enum import Enum
+from functools import lru_cache, partial
+from multiprocessing import Pool
 from typing import (
+    Dict,
     Tuple,
     List,
     Any,
@@ -9,6 +12,7 @@ from typing import (
     Optional,
     Callable,
     Set,
+    Type,
     TypeVar,
     cast,
 )
@@ -17,6 +21,20 @@ from rdkit.Chem.rdchem import Mol
 
 T = TypeVar("T")
 V = TypeVar("V")
+R = TypeVar("R", bound="ChemicalReaction")
+
+
+@lru_cache(maxsize=1024)
+def _compile_smarts(pattern: str) -> Mol:
+    """Compiles a SMARTS pattern, the compiled patterns are cached.
+
+    Args:
+        pattern: A SMARTS pattern.
+
+    Returns:
+        The compiled pattern.
+    """
+    return rdk.MolFromSmarts(pattern)
 
 
 class ChemicalReactionPart(Enum):
@@ -48,6 +66,11 @@ class ChemicalReaction:
         self.__reaction_smarts = reaction_smarts
         self.__remove_duplicates = remove_duplicates
         self.__smiles_to_mol_kwargs = kwargs
+
+        # The SMILES of the molecules by id. The molecule is stored alongside its SMILES,
+        # so the id can't be reused by another molecule while it is in the cache. The
+        # cache is not part of the pickled or copied state, as the ids change there
+        self.__smiles_cache: Dict[int, Tuple[Mol, str]] = {}
         self.reactants, self.agents, self.products = self.__reaction_to_mols(
             self.__reaction_smarts, sanitize
         )
@@ -71,29 +94,11 @@ class ChemicalReaction:
             The reaction SMARTS representing this instance.
         """
         return (
-            ".".join(
-                [
-                    rdk.MolToSmiles(m, **self.__smiles_to_mol_kwargs)
-                    for m in self.reactants
-                    if m
-                ]
-            )
+            ".".join([self._mol_to_smiles(m) for m in self.reactants if m])
             + ">"
-            + ".".join(
-                [
-                    rdk.MolToSmiles(m, **self.__smiles_to_mol_kwargs)
-                    for m in self.agents
-                    if m
-                ]
-            )
+            + ".".join([self._mol_to_smiles(m) for m in self.agents if m])
             + ">"
-            + ".".join(
-                [
-                    rdk.MolToSmiles(m, **self.__smiles_to_mol_kwargs)
-                    for m in self.products
-                    if m
-                ]
-            )
+            + ".".join([self._mol_to_smiles(m) for m in self.products if m])
         )
 
     def __eq__(self, other) -> bool:
@@ -118,17 +123,44 @@ class ChemicalReaction:
             return False
 
         # We care what the output of MolToSmiles is, so check for equality
-        # on this. Inefficient, but allows us to mutate the molecule at
-        # any time
+        # on this. The cached SMILES of the other reaction can be used as well,
+        # if it encodes its molecules with the same arguments
+        if self.__smiles_to_mol_kwargs == other.__smiles_to_mol_kwargs:
+            other_mol_to_smiles = other._mol_to_smiles
+        else:
+            other_mol_to_smiles = partial(
+                rdk.MolToSmiles, **self.__smiles_to_mol_kwargs
+            )
+
         molecules_self = (self.reactants, self.agents, self.products)
         molecules_other = (other.reactants, other.agents, other.products)
         for group_self, group_other in zip(molecules_self, molecules_other):
-            for a, b in zip(group_self, group_other):
-                if not self.__mols_equal(a, b):
-                    return False
+            if [self._mol_to_smiles(m) for m in group_self] != [
+                other_mol_to_smiles(m) for m in group_other
+            ]:
+                return False
 
         return True
 
+    def __getstate__(self) -> Dict[str, Any]:
+        """Returns the state of this instance for pickling and copying, without the SMILES cache.
+
+        Returns:
+            The state of this instance.
+        """
+        state = self.__dict__.copy()
+        del state["_ChemicalReaction__smiles_cache"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        """Restores the state of this instance from pickling and copying, with an empty SMILES cache.
+
+        Args:
+            state: The state of an instance.
+        """
+        self.__dict__.update(state)
+        self.__smiles_cache = {}
+
     #
     # Private Methods
     #
@@ -178,8 +210,34 @@ class ChemicalReaction:
             ],
         )
 
-    def __mol_to_smiles(self, mol: Mol) -> str:
+    @staticmethod
+    def __normalize_indices(indices: Iterable[int], length: int) -> Set[int]:
+        """Turns indices into a list of the given length into a set of non-negative indices.
+
+        Args:
+            indices: Indices into a list, negative indices count from the end.
+            length: The length of the list.
+
+        Raises:
+            IndexError: This error is raised if an index is out of range.
+
+        Returns:
+            The set of non-negative indices.
+        """
+        normalized = set()
+        for idx in indices:
+            if idx < -length or idx >= length:
+                raise IndexError("list assignment index out of range")
+            normalized.add(idx % length)
+        return normalized
+
+    #
+    # Protected Methods
+    #
+
+    def _mol_to_smiles(self, mol: Mol) -> str:
         """Encodes a molecule as a SMILES string by applying the rdkit MolToSmiles arguments supplied to this instantce.
+           The SMILES are cached per molecule, molecules are therefore not to be modified in place.
 
         Args:
             mol: An rdkit Mol instance.
@@ -187,10 +245,13 @@ class ChemicalReaction:
         Returns:
             The SMILES encoding of the input Mol.
         """
-        return rdk.MolToSmiles(mol, **self.__smiles_to_mol_kwargs)
+        cached = self.__smiles_cache.get(id(mol))
+        if cached is not None and cached[0] is mol:
+            return cached[1]
 
-    def __mols_equal(self, first_mol: Mol, second_mol: Mol) -> bool:
-        return self.__mol_to_smiles(first_mol) == self.__mol_to_smiles(second_mol)
+        smiles = rdk.MolToSmiles(mol, **self.__smiles_to_mol_kwargs)
+        self.__smiles_cache[id(mol)] = (mol, smiles)
+        return smiles
 
     #
     # Pubilc Methods
@@ -203,9 +264,7 @@ class ChemicalReaction:
             A list of SMILES of the reactants.
         """
         return [
-            rdk.MolToSmiles(reactant, **self.__smiles_to_mol_kwargs)
-            for reactant in self.reactants
-            if reactant
+            self._mol_to_smiles(reactant) for reactant in self.reactants if reactant
         ]
 
     def get_agents_as_smiles(self) -> List[str]:
@@ -214,11 +273,7 @@ class ChemicalReaction:
         Returns:
             A list of SMILES of the agents.
         """
-        return [
-            rdk.MolToSmiles(agent, **self.__smiles_to_mol_kwargs)
-            for agent in self.agents
-            if agent
-        ]
+        return [self._mol_to_smiles(agent) for agent in self.agents if agent]
 
     def get_products_as_smiles(self) -> List[str]:
         """Returns the products of this reactions as a list of SMILES.
@@ -226,11 +281,7 @@ class ChemicalReaction:
         Returns:
             A list of SMILES of the products.
         """
-        return [
-            rdk.MolToSmiles(product, **self.__smiles_to_mol_kwargs)
-            for product in self.products
-            if product
-        ]
+        return [self._mol_to_smiles(product) for product in self.products if product]
 
     def find(self, pattern: str) -> Tuple[List[int], List[int], List[int]]:
         """Find the occurences of a SMARTS pattern within the reaction and returns a tuple
@@ -242,25 +293,13 @@ class ChemicalReaction:
         Returns:
             A tuple of lists of indices from the lists of reactants, agents, and products.
         """
-        p = rdk.MolFromSmarts(pattern)
+        p = _compile_smarts(pattern)
 
         # Avoid three method calls and do it directly
         return (
-            [
-                i
-                for i, m in enumerate(self.reactants)
-                if m and len(list(m.GetSubstructMatch(p))) > 0
-            ],
-            [
-                i
-                for i, m in enumerate(self.agents)
-                if m and len(list(m.GetSubstructMatch(p))) > 0
-            ],
-            [
-                i
-                for i, m in enumerate(self.products)
-                if m and len(list(m.GetSubstructMatch(p))) > 0
-            ],
+            [i for i, m in enumerate(self.reactants) if m and m.HasSubstructMatch(p)],
+            [i for i, m in enumerate(self.agents) if m and m.HasSubstructMatch(p)],
+            [i for i, m in enumerate(self.products) if m and m.HasSubstructMatch(p)],
         )
 
     def find_in(self, pattern: str, reaction_part: ChemicalReactionPart) -> List[int]:
@@ -273,27 +312,21 @@ class ChemicalReaction:
         Returns:
             A list of indices from the list of molecules representing the chosen reaction part.
         """
-        p = rdk.MolFromSmarts(pattern)
+        p = _compile_smarts(pattern)
 
         if reaction_part == ChemicalReactionPart.reactants:
             return [
-                i
-                for i, m in enumerate(self.reactants)
-                if m and len(list(m.GetSubstructMatch(p))) > 0
+                i for i, m in enumerate(self.reactants) if m and m.HasSubstructMatch(p)
             ]
 
         if reaction_part == ChemicalReactionPart.agents:
             return [
-                i
-                for i, m in enumerate(self.agents)
-                if m and len(list(m.GetSubstructMatch(p))) > 0
+                i for i, m in enumerate(self.agents) if m and m.HasSubstructMatch(p)
             ]
 
         if reaction_part == ChemicalReactionPart.products:
             return [
-                i
-                for i, m in enumerate(self.products)
-                if m and len(list(m.GetSubstructMatch(p))) > 0
+                i for i, m in enumerate(self.products) if m and m.HasSubstructMatch(p)
             ]
 
         return []
@@ -316,17 +349,26 @@ class ChemicalReaction:
         Args:
             indices: The indices of the molecules to be removed from the reaction.
         """
-        if len(indices) > 0:
-            for idx in sorted(indices[0], reverse=True):
-                del self.reactants[idx]
+        molecules = (self.reactants, self.agents, self.products)
+        drop = [
+            ChemicalReaction.__normalize_indices(part_indices, len(part_molecules))
+            for part_indices, part_molecules in zip(indices, molecules)
+        ]
+
+        if len(drop) > 0 and len(drop[0]) > 0:
+            self.reactants[:] = [
+                m for idx, m in enumerate(self.reactants) if idx not in drop[0]
+            ]
 
-        if len(indices) > 1:
-            for idx in sorted(indices[1], reverse=True):
-                del self.agents[idx]
+        if len(drop) > 1 and len(drop[1]) > 0:
+            self.agents[:] = [
+                m for idx, m in enumerate(self.agents) if idx not in drop[1]
+            ]
 
-        if len(indices) > 2:
-            for idx in sorted(indices[2], reverse=True):
-                del self.products[idx]
+        if len(drop) > 2 and len(drop[2]) > 0:
+            self.products[:] = [
+                m for idx, m in enumerate(self.products) if idx not in drop[2]
+            ]
 
     @overload
     def filter(self, indices: Tuple[List[int]]) -> None:
@@ -346,20 +388,21 @@ class ChemicalReaction:
         Args:
             indices: The indices of the molecules to not be removed from the reaction.
         """
-        if len(indices) > 0 and len(indices[0]) > 0:
-            for idx in range(len(self.reactants) - 1, -1, -1):
-                if idx not in indices[0]:
-                    del self.reactants[idx]
+        # An empty list of indices keeps all the molecules of that part
+        keep = [set(part_indices) for part_indices in indices]
 
-        if len(indices) > 1 and len(indices[1]) > 0:
-            for idx in range(len(self.agents) - 1, -1, -1):
-                if idx not in indices[1]:
-                    del self.agents[idx]
+        if len(keep) > 0 and len(keep[0]) > 0:
+            self.reactants[:] = [
+                m for idx, m in enumerate(self.reactants) if idx in keep[0]
+            ]
 
-        if len(indices) > 2 and len(indices[2]) > 0:
-            for idx in range(len(self.products) - 1, -1, -1):
-                if idx not in indices[2]:
-                    del self.products[idx]
+        if len(keep) > 1 and len(keep[1]) > 0:
+            self.agents[:] = [m for idx, m in enumerate(self.agents) if idx in keep[1]]
+
+        if len(keep) > 2 and len(keep[2]) > 0:
+            self.products[:] = [
+                m for idx, m in enumerate(self.products) if idx in keep[2]
+            ]
 
     def sort(self, sort_reactants=True, sort_agents=True, sort_products=True) -> None:
         """Order the molecules participating in this reaction based on their SMILES strings.
@@ -370,36 +413,37 @@ class ChemicalReaction:
             sort_agents: Whether to sort the agents. Defaults to True.
             sort_products: Whether to sort the products. Defaults to True.
         """
-        # Mol to SMILES here is rather inefficient, but this allows for
-        # changes to the Mol objects at any time in the lifecycle of the instance
+        # The SMILES of the molecules are cached, so they are only encoded once
         if sort_reactants:
             self.reactants = sorted(
                 self.reactants,
-                key=lambda m: rdk.MolToSmiles(m, **self.__smiles_to_mol_kwargs),
+                key=self._mol_to_smiles,
             )
 
         if sort_agents:
             self.agents = sorted(
                 self.agents,
-                key=lambda m: rdk.MolToSmiles(m, **self.__smiles_to_mol_kwargs),
+                key=self._mol_to_smiles,
             )
 
         if sort_products:
             self.products = sorted(
                 self.products,
-                key=lambda m: rdk.MolToSmiles(m, **self.__smiles_to_mol_kwargs),
+                key=self._mol_to_smiles,
             )
 
     def remove_precursors_from_products(self) -> None:
         """Removes prodcuts that are also found in reactants or agents."""
 
-        reactants_smiles = self.get_reactants_as_smiles()
-        agents_smiles = self.get_agents_as_smiles()
-        products_smiles = self.get_products_as_smiles()
+        precursors_smiles = set(self.get_reactants_as_smiles())
+        precursors_smiles.update(self.get_agents_as_smiles())
 
-        for i, product in reversed(list(enumerate(products_smiles))):
-            if product in reactants_smiles or product in agents_smiles:
-                del self.products[i]
+        # Products that couldn't be parsed (None) are kept, they are not precursors
+        self.products[:] = [
+            product
+            for product in self.products
+            if not product or self._mol_to_smiles(product) not in precursors_smiles
+        ]
 
     def has_none(self) -> bool:
         """Checks whether the reactants, agents, or products contain None (usually due to failed rdkit MolFromSmiles).
@@ -412,10 +456,42 @@ class ChemicalReaction:
 
     def remove_none(self) -> None:
         """Removes all None values from the reactants, agents, and products."""
+        # Most reactions parse without errors, don't rebuild the lists for them
+        if not self.has_none():
+            return
+
         self.reactants = [m for m in self.reactants if m is not None]
         self.agents = [m for m in self.agents if m is not None]
         self.products = [m for m in self.products if m is not None]
 
+    #
+    # Class Methods
+    #
+    @classmethod
+    def from_many(
+        cls: Type[R],
+        reaction_smarts: Iterable[str],
+        processes: Optional[int] = None,
+        chunksize: int = 256,
+        **kwargs: Any
+    ) -> List[R]:
+        """Creates instances from many reaction SMARTS in parallel, using a pool of worker processes.
+           Only the reaction SMARTS are sent to the workers, the instances are sent back pickled.
+
+        Args:
+            reaction_smarts: Reaction SMARTS (for subclasses, whatever their constructor accepts first).
+            processes: The number of worker processes. Defaults to the number of CPUs.
+            chunksize: The number of reactions sent to a worker at once. Defaults to 256.
+            kwargs: Keyword arguments supplied to the constructor.
+
+        Returns:
+            The instances, in the order of the reaction SMARTS.
+        """
+        with Pool(processes) as pool:
+            return pool.map(
+                partial(cls, **kwargs), reaction_smarts, chunksize=chunksize
+            )
+
     #
     # Static Methods
     #
@@ -431,9 +507,8 @@ class ChemicalReaction:
                 Defaults to the elements of seq.
         """
         if key is None:
-
-            def key(x: T) -> V:
-                return x  # type: ignore
+            # dicts preserve the insertion order, fromkeys deduplicates in C
+            return list(dict.fromkeys(seq))
 
         key = cast(Callable[[T], V], key)  # necessary for mypy
 
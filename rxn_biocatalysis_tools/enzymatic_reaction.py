@@ -1,8 +1,8 @@
 """Enzymatic reaction representation."""
+
 import re
-from typing import List, Any
+from typing import List, Any, Dict, Optional, Tuple
 from .chemical_reaction import ChemicalReaction
-from rdkit.Chem import AllChem as rdk
 from rdkit.Chem.rdchem import Mol
 
 UNKNOWN_CHEMICAL_REGEX = re.compile(r"^(<.*>)$|^(<)|(>)$")
@@ -31,18 +31,37 @@ class EnzymaticReaction(ChemicalReaction):
             sanitize: whether sanitization is enabled. Defaults to True.
             source: source for the enzymatic reaction. Defaults to "unknown".
         """
-        vals = re.split(r">|\|", enzymatic_reaction_smiles)
-        if len(vals) < 2:
-            vals.append("")
-
-        self.ec: List[str] = [level.strip() for level in vals[1].split(".")]
+        # The EC is located between the pipe and the first ">" following it
+        reaction_smiles = enzymatic_reaction_smiles
+        ec = ""
+
+        pipe_index = enzymatic_reaction_smiles.find("|")
+        if pipe_index > -1:
+            arrow_index = enzymatic_reaction_smiles.find(">", pipe_index)
+            if arrow_index > -1:
+                ec_start = pipe_index + 1
+                ec = enzymatic_reaction_smiles[ec_start:arrow_index]
+                reaction_smiles = (
+                    enzymatic_reaction_smiles[:pipe_index]
+                    + enzymatic_reaction_smiles[arrow_index:]
+                )
+
+        self.ec: List[str] = [level.strip() for level in ec.split(".")]
         self.source = source
 
+        # The hash, together with the EC and molecules it was computed from. It is not
+        # pickled, as the hashes of strings differ between processes
+        self._hash_cache: Optional[Tuple[Tuple[Any, ...], int]] = None
+
+        # to_string results per EC depth, together with the state they were computed from
+        self._to_string_cache: Dict[int, Tuple[Tuple[Any, ...], str]] = {}
+
         # hack
         self.kwargs = kwargs
+        self._sanitize = sanitize
 
         super().__init__(
-            enzymatic_reaction_smiles.replace(f"|{vals[1]}", ""),
+            reaction_smiles,
             remove_duplicates,
             sanitize,
             **kwargs,
@@ -54,24 +73,15 @@ class EnzymaticReaction(ChemicalReaction):
         Returns:
             the extended reaction SMARTS representing this instance.
         """
-        s = (
-            ".".join(
-                sorted([rdk.MolToSmiles(m, **self.kwargs) for m in self.reactants if m])
-            )
-            + ">"
-            + ".".join(
-                sorted([rdk.MolToSmiles(m, **self.kwargs) for m in self.agents if m])
-            )
-            + ">"
-            + ".".join(
-                sorted([rdk.MolToSmiles(m, **self.kwargs) for m in self.products if m])
-            )
+        reactants, agents, products = (
+            ".".join(sorted([self._mol_to_smiles(m) for m in molecules if m]))
+            for molecules in (self.reactants, self.agents, self.products)
         )
-        s_parts = s.split(">")
 
+        # SMILES don't contain spaces, only the EC levels could
         if len(self.ec) > 0 and self.ec[0] != "":
-            s_parts[0] += f'|{".".join(self.ec)}'
-        return ">".join(s_parts).replace(" ", "")
+            reactants += "|" + ".".join(self.ec).replace(" ", "")
+        return f"{reactants}>{agents}>{products}"
 
     def __eq__(self, other: object) -> bool:
         """Compares the count, order, and SMILES string of each molecule in this reaction as well as the EC.
@@ -86,7 +96,16 @@ class EnzymaticReaction(ChemicalReaction):
             raise NotImplementedError(
                 "EnzymaticReaction can be tested for equality with EnzymaticReaction objects"
             )
-        return super().__eq__(other) and self.ec == other.ec
+        if self.ec != other.ec:
+            return False
+
+        # The (cached) hashes only differ if the ordered SMILES do, which means
+        # the molecules differ as well. The hash is never carried over from
+        # another process (see __getstate__), so it can't be stale
+        if self.kwargs == other.kwargs and hash(self) != hash(other):
+            return False
+
+        return super().__eq__(other)
 
     def __hash__(self) -> int:
         """Get hash for the enzymatic reaction.
@@ -94,7 +113,28 @@ class EnzymaticReaction(ChemicalReaction):
         Returns:
             enzymatic reaction hash.
         """
-        return hash(str(self))
+        # Only recompute the hash once the EC or the molecule lists have been changed,
+        # the state holds references to the molecules, so their ids stay unique
+        state = (
+            tuple(self.ec),
+            tuple(self.reactants),
+            tuple(self.agents),
+            tuple(self.products),
+        )
+        if self._hash_cache is None or self._hash_cache[0] != state:
+            self._hash_cache = (state, hash(str(self)))
+        return self._hash_cache[1]
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Get the state for pickling and copying, without the cached hash and strings.
+
+        Returns:
+            the state of the enzymatic reaction.
+        """
+        state = super().__getstate__()
+        state["_hash_cache"] = None
+        state["_to_string_cache"] = {}
+        return state
 
     def mol_to_smiles(self, mol: Mol) -> str:
         """Applies the kwargs supplied to the reaction to MolToSmiles for a given molecule.
@@ -105,7 +145,7 @@ class EnzymaticReaction(ChemicalReaction):
         Returns:
            the string representing the molecule.
         """
-        return rdk.MolToSmiles(mol, **self.kwargs)
+        return self._mol_to_smiles(mol)
 
     def to_string(self, ec_depth: int = 4) -> str:
         """Get the string representing this reaction with a certain number of EC levels.
@@ -113,12 +153,59 @@ class EnzymaticReaction(ChemicalReaction):
         Args:
             ec_depth: the number of EC classes to include (top-down). Defaults to 4.
 
+        The molecules are always encoded as canonical SMILES with the default MolToSmiles
+        arguments, independent of the arguments supplied to this instance.
+
+        Returns:
+           the string representing this reaction with the chosen levels of EC.
+        """
+        # The result is memoized as long as the EC and the molecule lists have not been
+        # changed (the state holds references to the molecules, so their ids stay unique)
+        state = (
+            tuple(self.ec),
+            tuple(self.reactants),
+            tuple(self.agents),
+            tuple(self.products),
+        )
+        cached = self._to_string_cache.get(ec_depth)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+
+        rxn_string = self.__to_string(ec_depth)
+        self._to_string_cache[ec_depth] = (state, rxn_string)
+        return rxn_string
+
+    def __to_string(self, ec_depth: int) -> str:
+        """Build the string representing this reaction with a certain number of EC levels.
+
+        Args:
+            ec_depth: the number of EC classes to include (top-down).
+
         Returns:
            the string representing this reaction with the chosen levels of EC.
         """
-        cpy = EnzymaticReaction(str(self))
-        cpy.ec = cpy.ec[:ec_depth]
-        return str(cpy).strip()
+        # The cached SMILES are only encoded like that for the default arguments
+        # and sanitized molecules, parse str(self) again otherwise
+        if not self._sanitize or self.kwargs not in ({}, {"canonical": True}):
+            cpy = EnzymaticReaction(str(self))
+            cpy.ec = cpy.ec[:ec_depth]
+            return str(cpy).strip()
+
+        # Build the string from the (cached) SMILES instead of parsing str(self) again,
+        # dropping duplicate molecules like the parsing would
+        parts = [
+            ".".join(
+                ChemicalReaction.remove_duplicates(
+                    sorted([self._mol_to_smiles(m) for m in molecules if m])
+                )
+            )
+            for molecules in (self.reactants, self.agents, self.products)
+        ]
+
+        ec = self.ec[:ec_depth]
+        if len(ec) > 0 and ec[0] != "":
+            parts[0] += f'|{".".join(ec)}'
+        return ">".join(parts).replace(" ", "").strip()
 
     def get_ec(self, ec_depth: int = 4) -> str:
         """Get the string representing the EC of this reaction.
@@ -137,11 +224,54 @@ class EnzymaticReaction(ChemicalReaction):
         Returns:
             the reversed enzymatic reactions.
         """
-        return EnzymaticReaction.from_smarts_and_ec(
-            f"{'.'.join(self.get_products_as_smiles())}>>{'.'.join(self.get_reactants_as_smiles())}",
-            self.get_ec(),
+        # Reuse the molecules instead of parsing their SMILES again, dropping
+        # duplicate molecules and agents like the parsing of products>>reactants would
+        return EnzymaticReaction._from_mols(
+            ChemicalReaction.remove_duplicates(
+                [m for m in self.products if m], key=self._mol_to_smiles
+            ),
+            [],
+            ChemicalReaction.remove_duplicates(
+                [m for m in self.reactants if m], key=self._mol_to_smiles
+            ),
+            [level.strip() for level in self.get_ec().split(".")],
             self.source,
+            self._sanitize,
+            **self.kwargs,
+        )
+
+    @staticmethod
+    def _from_mols(
+        reactants: List[Mol],
+        agents: List[Mol],
+        products: List[Mol],
+        ec: List[str],
+        source: str = "unknown",
+        sanitize: bool = True,
+        **kwargs: Any,
+    ) -> "EnzymaticReaction":
+        """Creates an EnzymaticReaction instance from existing molecules, without parsing any SMILES.
+
+        Args:
+            reactants: the reactants.
+            agents: the agents.
+            products: the products.
+            ec: the EC levels.
+            source: source for the enzymatic reaction. Defaults to "unknown".
+            sanitize: whether the molecules have been sanitized. Defaults to True.
+            kwargs: keyword arguments supplied to rdkit's MolToSmiles.
+
+        Returns:
+            an EnzymaticReaction instance.
+        """
+        enzymatic_reaction = EnzymaticReaction(
+            ">>", sanitize=sanitize, source=source, **kwargs
         )
+        enzymatic_reaction.reactants = reactants
+        enzymatic_reaction.agents = agents
+        enzymatic_reaction.products = products
+        enzymatic_reaction.ec = ec
+        return enzymatic_reaction
 
     @staticmethod
     def from_smarts_and_ec(
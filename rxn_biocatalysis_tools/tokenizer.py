@@ -1,8 +1,29 @@
 """Tokenizer for enzymatic reactions."""
 import re
+from functools import lru_cache
+from typing import Any, Iterable, List, Optional
 
 SMILES_TOKENIZER_PATTERN = r"(\%\([0-9]{3}\)|\[[^\]]+]|Br?|Cl?|N|O|S|P|F|I|b|c|n|o|s|p|\||\(|\)|\.|=|#|-|\+|\\|\/|:|~|@|\?|>>?|\*|\$|\%[0-9]{2}|[0-9])"
 SMILES_REGEX = re.compile(SMILES_TOKENIZER_PATTERN)
+_EC_SPLIT = re.compile(r">|\|")
+# The opening of the EC tokens per level
+_EC_PREFIX = ("[v", "[u", "[t", "[q")
+# Removes the remaining characters of the EC tokens in the detokenizer
+_EC_DETOK_TABLE = str.maketrans("", "", "utq]")
+
+# Batches are scanned at once with the linear time re2 engine if it is installed
+# (pip install google-re2), it has the same (leftmost-first) semantics as re for this
+# pattern. The batch pattern additionally matches the line breaks separating the SMILES,
+# bracket atoms must not span them
+_SMILES_BATCH_PATTERN = (
+    SMILES_TOKENIZER_PATTERN.replace(r"\[[^\]]+]", r"\[[^\]\n]+]", 1)[:-1] + "|\n)"
+)
+try:
+    import re2
+
+    _SMILES_BATCH_REGEX: Optional[Any] = re2.compile(_SMILES_BATCH_PATTERN)
+except ImportError:
+    _SMILES_BATCH_REGEX = None
 
 
 def tokenize_enzymatic_reaction_smiles(rxn: str, keep_pipe=False) -> str:
@@ -16,17 +37,17 @@ def tokenize_enzymatic_reaction_smiles(rxn: str, keep_pipe=False) -> str:
     Returns:
         the tokenized enzymatic reaction SMILES.
     """
-    parts = re.split(r">|\|", rxn)
+    # Only the part between the first two separators (the EC) is needed
+    parts = _EC_SPLIT.split(rxn, maxsplit=2)
     ec = parts[1].split(".")
 
     rxn = rxn.replace(f"|{parts[1]}", "")
-    tokens = [token for token in SMILES_REGEX.findall(rxn)]
-    arrow_index = tokens.index(">>")
-
-    levels = ["v", "u", "t", "q"]
+    tokens = SMILES_REGEX.findall(rxn)
 
+    # The position of the arrow is only needed to insert the EC tokens
     if ec[0] != "":
-        ec_tokens = [f"[{levels[i]}{e}]" for i, e in enumerate(ec)]
+        arrow_index = tokens.index(">>")
+        ec_tokens = [_EC_PREFIX[i] + e + "]" for i, e in enumerate(ec)]
         if keep_pipe:
             ec_tokens.insert(0, "|")
         tokens[arrow_index:arrow_index] = ec_tokens
@@ -70,10 +91,7 @@ def detokenize_enzymatic_reaction_smiles(rxn: str) -> str:
         reaction_split[0]
         .replace("][", ".")
         .replace("[v", "")
-        .replace("u", "")
-        .replace("t", "")
-        .replace("q", "")
-        .replace("]", "")
+        .translate(_EC_DETOK_TABLE)
     )
 
     return precursor_split[0] + "|" + ec + ">>" + reaction_split[1]
@@ -88,5 +106,35 @@ def tokenize_smiles(smiles: str) -> str:
         SMILES string after tokenization, for instance 'C C ( C O ) = N >> C C ( C = O ) N'.
     """
 
-    tokens = [token for token in SMILES_REGEX.findall(smiles)]
-    return " ".join(tokens)
+    return " ".join(SMILES_REGEX.findall(smiles))
+
+
+@lru_cache(maxsize=2**16)
+def tokenize_smiles_cached(smiles: str) -> str:
+    """
+    Memoized variant of tokenize_smiles for inputs containing many repeated SMILES.
+    Args:
+        smiles: SMILES string to tokenize, for instance 'CC(CO)=N>>CC(C=O)N'.
+    Returns:
+        SMILES string after tokenization, for instance 'C C ( C O ) = N >> C C ( C = O ) N'.
+    """
+    return tokenize_smiles(smiles)
+
+
+def tokenize_smiles_batch(smiles: Iterable[str]) -> List[str]:
+    """
+    Tokenize many SMILES molecules or reactions, in a single scan of the re2 engine if installed.
+    Args:
+        smiles: SMILES strings to tokenize, they must not contain line breaks.
+    Returns:
+        the tokenized SMILES strings, in the same order.
+    """
+    smiles = list(smiles)
+    if _SMILES_BATCH_REGEX is None:
+        return [tokenize_smiles(smi) for smi in smiles]
+
+    if not smiles:
+        return []
+
+    tokens = _SMILES_BATCH_REGEX.findall("\n".join(smiles))
+    return [tokenized.strip() for tokenized in " ".join(tokens).split("\n")]
@@ -1,11 +1,39 @@
 """Generic utilities."""
+from functools import lru_cache
+
+import rdkit.rdBase as rkrb
+import rdkit.RDLogger as rkl
+
+from .enzymatic_reaction import EnzymaticReaction
+
+_RDKIT_LOGGING_DISABLED = False
 
 
 def disable_rdkit_logging() -> None:
-    """Disables RDKit whiny logging."""
-    import rdkit.rdBase as rkrb
-    import rdkit.RDLogger as rkl
+    """Disables RDKit whiny logging. Calling it more than once has no further effect."""
+    global _RDKIT_LOGGING_DISABLED
+    if _RDKIT_LOGGING_DISABLED:
+        return
 
     logger = rkl.logger()
     logger.setLevel(rkl.ERROR)
     rkrb.DisableLog("rdApp.error")
+    _RDKIT_LOGGING_DISABLED = True
+
+
+@lru_cache(maxsize=2**16)
+def canon_smiles_cached(smiles: str) -> str:
+    """Canonicalizes and orders the molecules of a SMILES string (e.g. the precursors of a reaction).
+
+    The results are memoized, as the same molecules occur many times in enzymatic reaction data.
+
+    Args:
+        smiles: a SMILES string, molecules separated by ".".
+
+    Returns:
+        the sorted and canonicalized SMILES of the molecules, separated by ".".
+    """
+    # ">>" is needed for it to be recoganised as a valid rxn smiles / smarts
+    rxn = EnzymaticReaction(smiles + ">>")
+    rxn.sort()
+    return ".".join(rxn.get_reactants_as_smiles())
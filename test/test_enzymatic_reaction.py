@@ -1,5 +1,13 @@
 """Testing enzymatic reaction class."""
+
+import copy
+import os
+import pickle
+import subprocess
+import sys
+
 import pytest
+from rdkit.Chem import AllChem as rdk
 from rxn_biocatalysis_tools import EnzymaticReaction
 
 
@@ -17,6 +25,54 @@ def test_constructor(enzymatic_reaction: EnzymaticReaction):
     )
 
 
+def test_constructor_without_ec():
+    enzymatic_reaction = EnzymaticReaction("CCO>O>CC=O")
+    assert enzymatic_reaction.ec == [""]
+    assert str(enzymatic_reaction) == "CCO>O>CC=O"
+
+    enzymatic_reaction = EnzymaticReaction("CCO|1.1.1.1>O>CC=O")
+    assert enzymatic_reaction.ec == ["1", "1", "1", "1"]
+    assert str(enzymatic_reaction) == "CCO|1.1.1.1>O>CC=O"
+
+
+def test_hash(enzymatic_reaction: EnzymaticReaction):
+    assert hash(enzymatic_reaction) == hash(str(enzymatic_reaction))
+    enzymatic_reaction.ec = ["4", "1"]
+    assert hash(enzymatic_reaction) == hash(str(enzymatic_reaction))
+    enzymatic_reaction.remove(([], [], [0]))
+    assert hash(enzymatic_reaction) == hash(str(enzymatic_reaction))
+
+
+def pickle_in_subprocess(enzymatic_reaction_smiles: str, hash_seed: int) -> bytes:
+    """Pickle a hashed enzymatic reaction in a process with another hash seed."""
+    code = (
+        "import pickle, sys\n"
+        "from rxn_biocatalysis_tools import EnzymaticReaction\n"
+        "rxn = EnzymaticReaction(sys.argv[1])\n"
+        "hash(rxn)\n"
+        "sys.stdout.buffer.write(pickle.dumps(rxn))\n"
+    )
+    return subprocess.run(
+        [sys.executable, "-c", code, enzymatic_reaction_smiles],
+        env={**os.environ, "PYTHONHASHSEED": str(hash_seed)},
+        stdout=subprocess.PIPE,
+        check=True,
+    ).stdout
+
+
+def test_hash_after_unpickling():
+    enzymatic_reaction = pickle.loads(pickle_in_subprocess("CCO|1.1.1.1>>CC=O", 1))
+    fresh_enzymatic_reaction = EnzymaticReaction("CCO|1.1.1.1>>CC=O")
+    assert hash(enzymatic_reaction) == hash(fresh_enzymatic_reaction)
+    assert enzymatic_reaction in {fresh_enzymatic_reaction}
+
+
+def test_eq_after_unpickling():
+    enzymatic_reaction = pickle.loads(pickle_in_subprocess("CCO|1.1.1.1>>CC=O", 2))
+    assert enzymatic_reaction == EnzymaticReaction("CCO|1.1.1.1>>CC=O")
+    assert enzymatic_reaction != EnzymaticReaction("CCO|1.1.1.1>>CC(=O)O")
+
+
 def test_mol_to_smiles(enzymatic_reaction: EnzymaticReaction):
     assert (
         enzymatic_reaction.mol_to_smiles(enzymatic_reaction.products[0])
@@ -51,6 +107,36 @@ def test_to_string(enzymatic_reaction: EnzymaticReaction):
     )
 
 
+def test_to_string_after_modification(enzymatic_reaction: EnzymaticReaction):
+    assert (
+        enzymatic_reaction.to_string(1)
+        == "N[C@@H](Cc1c[nH]c2ccc(F)cc12)C(=O)O|4>>NCCc1c[nH]c2ccc(F)cc12"
+    )
+    assert enzymatic_reaction.to_string(1) is enzymatic_reaction.to_string(1)
+    enzymatic_reaction.ec = ["3", "1"]
+    assert (
+        enzymatic_reaction.to_string(1)
+        == "N[C@@H](Cc1c[nH]c2ccc(F)cc12)C(=O)O|3>>NCCc1c[nH]c2ccc(F)cc12"
+    )
+    enzymatic_reaction.products = []
+    assert enzymatic_reaction.to_string(1) == "N[C@@H](Cc1c[nH]c2ccc(F)cc12)C(=O)O|3>>"
+
+
+def test_to_string_removes_duplicates():
+    enzymatic_reaction = EnzymaticReaction(
+        "OCC.CCO|1.1.1.1>>CC=O", remove_duplicates=False
+    )
+    assert enzymatic_reaction.to_string(2) == "CCO|1.1>>CC=O"
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{"kekuleSmiles": True}, {"canonical": False}, {"sanitize": False}]
+)
+def test_to_string_is_canonical(kwargs):
+    enzymatic_reaction = EnzymaticReaction("Cc1ccccc1.OCC|1.1.1.1>>C1=CC=CC=C1", **kwargs)
+    assert enzymatic_reaction.to_string(2) == "CCO.Cc1ccccc1|1.1>>c1ccccc1"
+
+
 def test_get_ec(enzymatic_reaction: EnzymaticReaction):
     assert enzymatic_reaction.get_ec(1) == "4"
     assert enzymatic_reaction.get_ec(2) == "4.1"
@@ -58,6 +144,53 @@ def test_get_ec(enzymatic_reaction: EnzymaticReaction):
     assert enzymatic_reaction.get_ec(4) == "4.1.1.28"
 
 
+def test_find(enzymatic_reaction: EnzymaticReaction):
+    assert enzymatic_reaction.find("C(=O)[OH]") == ([0], [], [])
+    assert enzymatic_reaction.find("c1ccccc1F") == ([0], [], [0])
+    assert enzymatic_reaction.find("[Cl]") == ([], [], [])
+
+
+def test_remove():
+    enzymatic_reaction = EnzymaticReaction("CCO.CCN.CCCl|1.1.1.1>O>CC=O.CC")
+    enzymatic_reaction.remove(([2, 0], [], [1]))
+    assert str(enzymatic_reaction) == "CCN|1.1.1.1>O>CC=O"
+
+
+def test_remove_negative_indices():
+    enzymatic_reaction = EnzymaticReaction("CCO.CCN.CCCl|1.1.1.1>O>CC=O.CC")
+    enzymatic_reaction.remove(([-1],))
+    assert str(enzymatic_reaction) == "CCN.CCO|1.1.1.1>O>CC.CC=O"
+    enzymatic_reaction.remove(([0, -1], [], [-2]))
+    assert str(enzymatic_reaction) == "|1.1.1.1>O>CC"
+
+
+def test_remove_out_of_range():
+    enzymatic_reaction = EnzymaticReaction("CCO.CCN|1.1.1.1>O>CC=O")
+    with pytest.raises(IndexError):
+        enzymatic_reaction.remove(([2],))
+    with pytest.raises(IndexError):
+        enzymatic_reaction.remove(([], [-2]))
+    assert str(enzymatic_reaction) == "CCN.CCO|1.1.1.1>O>CC=O"
+
+
+def test_filter():
+    enzymatic_reaction = EnzymaticReaction("CCO.CCN.CCCl|1.1.1.1>O>CC=O.CC")
+    enzymatic_reaction.filter(([2, 0], [], [1]))
+    assert str(enzymatic_reaction) == "CCCl.CCO|1.1.1.1>O>CC"
+
+
+def test_remove_precursors_from_products():
+    enzymatic_reaction = EnzymaticReaction("CCO.O|1.1.1.1>>CC=O.OCC.O")
+    enzymatic_reaction.remove_precursors_from_products()
+    assert enzymatic_reaction.get_products_as_smiles() == ["CC=O"]
+
+    # Products that couldn't be parsed don't shift the removed indices
+    enzymatic_reaction = EnzymaticReaction("CCO|1.1.1.1>>C1CC.CCO.CC=O")
+    enzymatic_reaction.remove_precursors_from_products()
+    assert enzymatic_reaction.products[0] is None
+    assert enzymatic_reaction.get_products_as_smiles() == ["CC=O"]
+
+
 def test_reverse(enzymatic_reaction: EnzymaticReaction):
     assert (
         enzymatic_reaction.reverse().to_string()
@@ -65,12 +198,80 @@ def test_reverse(enzymatic_reaction: EnzymaticReaction):
     )
 
 
+def test_reverse_with_kwargs():
+    enzymatic_reaction = EnzymaticReaction(
+        "C[C@H](N)O|1.1.1.1>>CC=O", isomericSmiles=False
+    )
+    reversed_reaction = enzymatic_reaction.reverse()
+    assert reversed_reaction.kwargs == {"isomericSmiles": False}
+    assert str(reversed_reaction) == "CC=O|1.1.1.1>>CC(N)O"
+
+
 def test_from_smarts_and_ec(enzymatic_reaction: EnzymaticReaction):
     assert enzymatic_reaction == EnzymaticReaction.from_smarts_and_ec(
         "N[C@@H](Cc1c[nH]c2ccc(F)cc12)C(=O)O>>NCCc1c[nH]c2ccc(F)cc12", "4.1.1.28"
     )
 
 
+@pytest.mark.parametrize(
+    "round_trip", [lambda rxn: pickle.loads(pickle.dumps(rxn)), copy.deepcopy]
+)
+def test_modification_after_round_trip(round_trip):
+    enzymatic_reaction = EnzymaticReaction("CCO|1.1.1.1>>CC=O")
+    str(enzymatic_reaction)
+    enzymatic_reaction = round_trip(enzymatic_reaction)
+
+    # New molecules must not be encoded with the SMILES cached for the old ones
+    for _ in range(100):
+        enzymatic_reaction.products = [rdk.MolFromSmiles("Nc1ccccc1")]
+        assert enzymatic_reaction.get_products_as_smiles() == ["Nc1ccccc1"]
+    assert str(enzymatic_reaction) == "CCO|1.1.1.1>>Nc1ccccc1"
+
+
+def test_from_many():
+    rxn_smiles = [
+        "N[C@@H](Cc1c[nH]c2ccc(F)cc12)C(=O)O|4.1.1.28>>NCCc1c[nH]c2ccc(F)cc12",
+        "CCO|1.1.1.1>>CC=O",
+    ]
+    enzymatic_reactions = EnzymaticReaction.from_many(
+        rxn_smiles, processes=2, source="test"
+    )
+    assert [str(rxn) for rxn in enzymatic_reactions] == rxn_smiles
+    assert all(rxn.source == "test" for rxn in enzymatic_reactions)
+
+
+def test_from_many_modification():
+    enzymatic_reactions = EnzymaticReaction.from_many(
+        ["CCO.O|1.1.1.1>>CC=O.CCN", "CCO|1.1.1.1>>CC=O"], processes=2
+    )
+    for rxn in enzymatic_reactions:
+        str(rxn)
+
+    # The returned instances are unpickled, their molecules must be encoded anew
+    enzymatic_reactions[0].filter(([0], [], [1]))
+    enzymatic_reactions[1].products = [rdk.MolFromSmiles("Nc1ccccc1")]
+    assert [str(rxn) for rxn in enzymatic_reactions] == [
+        "CCO|1.1.1.1>>CCN",
+        "CCO|1.1.1.1>>Nc1ccccc1",
+    ]
+
+
+def test_eq():
+    assert EnzymaticReaction("CCO.O|1.1.1.1>>CC=O") == EnzymaticReaction(
+        "OCC.O|1.1.1.1>>CC=O"
+    )
+    # The order of the molecules matters
+    assert EnzymaticReaction("CCO.O|1.1.1.1>>CC=O") != EnzymaticReaction(
+        "O.CCO|1.1.1.1>>CC=O"
+    )
+    assert EnzymaticReaction("CCO.O|1.1.1.1>>CC=O") != EnzymaticReaction(
+        "CCO.O|1.1.1.2>>CC=O"
+    )
+    assert EnzymaticReaction("CCO.O|1.1.1.1>>CC=O") != EnzymaticReaction(
+        "CCO.N|1.1.1.1>>CC=O"
+    )
+
+
 def test_is_valid(enzymatic_reaction: EnzymaticReaction):
     assert EnzymaticReaction.is_valid(
         "NCCc1c[nH]c2ccc(F)cc12|4.1.1.28>>N[C@@H](Cc1c[nH]c2ccc(F)cc12)C(=O)O"
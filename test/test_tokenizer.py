@@ -1,9 +1,13 @@
 """Testing enzymatic reaction tokenizer."""
+import re
 import pytest
 from rxn_biocatalysis_tools import (
     tokenize_enzymatic_reaction_smiles,
     detokenize_enzymatic_reaction_smiles,
+    tokenize_smiles,
+    tokenize_smiles_batch,
 )
+from rxn_biocatalysis_tools import tokenizer
 
 
 @pytest.fixture
@@ -60,3 +64,22 @@ def test_detokenize_enzymatic_reaction_smiles_part(
         detokenize_enzymatic_reaction_smiles(tok_enzymatic_reaction_smiles_part)
         == enzymatic_reaction_smiles_part
     )
+
+
+@pytest.mark.parametrize("single_scan", [False, True])
+def test_tokenize_smiles_batch(monkeypatch, single_scan: bool):
+    if single_scan:
+        # re has the same semantics as re2 for the batch pattern
+        monkeypatch.setattr(
+            tokenizer,
+            "_SMILES_BATCH_REGEX",
+            re.compile(tokenizer._SMILES_BATCH_PATTERN),
+        )
+
+    smiles = ["CC(CO)=N>>CC(C=O)N", "", "BrC[C@@H](Cl)O", "c1ccccc1"]
+    assert tokenize_smiles_batch(smiles) == [tokenize_smiles(smi) for smi in smiles]
+
+    # Unbalanced brackets must not be matched across the SMILES
+    smiles = ["C[N", "O]C"]
+    assert tokenize_smiles_batch(smiles) == [tokenize_smiles(smi) for smi in smiles]
+    assert tokenize_smiles_batch([]) == []
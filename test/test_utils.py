@@ -0,0 +1,8 @@
+"""Testing generic utilities."""
+from rxn_biocatalysis_tools import canon_smiles_cached
+
+
+def test_canon_smiles_cached():
+    assert canon_smiles_cached("OCC.C(=O)O") == "CCO.O=CO"
+    assert canon_smiles_cached("OCC.C(=O)O") == "CCO.O=CO"
+    assert canon_smiles_cached.cache_info().hits > 0